@@ -11,20 +11,39 @@
 
 """
 
+import argparse
 import configparser
+import fnmatch
+import hashlib
+import json
 import logging
 import os
 import shutil
+import socket
 import subprocess
+import sys
 import time
+import uuid
 import threading
 import tkinter as tk
+import zipfile
+from collections import OrderedDict, deque
 from tkinter import filedialog, ttk
 from tkinter import messagebox
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from dataclasses import asdict, dataclass, fields, replace
 from pathlib import Path
 from threading import Thread
+from xml.sax.saxutils import escape
 from PIL import Image, ImageTk, UnidentifiedImageError
 import img2pdf
+import pikepdf
+
+try:
+    import fcntl
+except ImportError:  # Windows平台没有fcntl, 跳过reflink
+    fcntl = None
 
 # 全局颜色配置
 COLOR_PRIMARY = "#3498db"
@@ -167,6 +186,267 @@ def configure_styles():
                     darkcolor=COLOR_PRIMARY)
 
 
+# 默认配置
+DEFAULT_SOURCE_DIR = '~/Documents/magazine_images'
+DEFAULT_TARGET_DIR = '~/Documents/Books/magazine_pdfs'
+DEFAULT_ADB_PORT = '7555'
+DEFAULT_EMULATOR_PATH = '/sdcard/Android/data/cn.com.bookan/files/bookan/magazine'
+DEFAULT_MEMORY_BUDGET_MB = 1024
+DEFAULT_DISK_HEADROOM_MB = 1024
+
+
+class PreferencesStore:
+    """preferences.cfg读写
+
+    读取结果按文件修改时间缓存, 只有文件变化时才重新解析;
+    保存请求在短时间内合并, 通过临时文件原子替换写入。
+    """
+
+    def __init__(self, path, save_delay=0.5):
+        self.path = path
+        self.save_delay = save_delay
+        self.lock = threading.Lock()
+        self.config = None
+        self.mtime = None
+        self.pending = None
+        self.timer = None
+
+    def load(self):
+        """读取配置, 文件未变化时返回缓存结果"""
+        with self.lock:
+            if self.pending is not None:
+                return self.pending
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if self.config is None or mtime != self.mtime:
+                config = configparser.ConfigParser()
+                if mtime is not None:
+                    config.read(self.path, encoding='utf-8')
+                self.config, self.mtime = config, mtime
+            return self.config
+
+    def save(self, config):
+        """延迟保存配置, 合并短时间内的多次写入"""
+        with self.lock:
+            self.pending = config
+            if self.timer is None:
+                self.timer = threading.Timer(self.save_delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """立即写入尚未保存的配置"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            config, self.pending = self.pending, None
+            if config is None:
+                return
+
+            part_path = f'{self.path}.part'
+            with open(part_path, 'w', encoding='utf-8') as configfile:
+                config.write(configfile)
+            os.replace(part_path, self.path)
+            self.config = config
+            self.mtime = os.stat(self.path).st_mtime_ns
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    """一次批处理的任务规格
+
+    在批处理开始时解析一次, 之后不再读取配置文件,
+    可序列化后交给线程池或远程转换节点。
+    """
+
+    source_dir: str
+    target_dir: str
+    output_formats: tuple = ('pdf',)
+    thumbnail_quality: int = 85  # 仅作用于JPEG缩略图
+    adb_port: str = DEFAULT_ADB_PORT
+    emulator_path: str = DEFAULT_EMULATOR_PATH
+    max_workers: int = 0  # 0表示按CPU核数
+    memory_budget_mb: int = DEFAULT_MEMORY_BUDGET_MB
+    priorities: tuple = ()  # ((magazine_id, priority), ...)
+    disk_headroom_mb: int = DEFAULT_DISK_HEADROOM_MB
+    trace_dir: str = ''  # 为空时不记录时间线
+
+    @classmethod
+    def from_config(cls, config):
+        """从preferences.cfg的解析结果构建任务规格"""
+        output_format = config.get('OUTPUT', 'format', fallback='PDF')
+        return cls(
+            source_dir=os.path.expanduser(
+                config.get('LOCAL', 'source_dir', fallback=DEFAULT_SOURCE_DIR)),
+            target_dir=os.path.expanduser(
+                config.get('LOCAL', 'target_dir', fallback=DEFAULT_TARGET_DIR)),
+            output_formats=OUTPUT_FORMAT_CHOICES.get(output_format, ('pdf',)),
+            thumbnail_quality=max(1, min(100, config.getint(
+                'OUTPUT', 'thumbnail_quality', fallback=85))),
+            adb_port=config.get('ADB', 'port', fallback=DEFAULT_ADB_PORT),
+            emulator_path=config.get('ADB', 'emulator_path',
+                                     fallback=DEFAULT_EMULATOR_PATH),
+            max_workers=config.getint('SCHEDULER', 'max_workers', fallback=0),
+            memory_budget_mb=config.getint('SCHEDULER', 'memory_budget_mb',
+                                           fallback=DEFAULT_MEMORY_BUDGET_MB),
+            priorities=parse_priorities(
+                config.get('SCHEDULER', 'priorities', fallback='')),
+            disk_headroom_mb=config.getint('STORAGE', 'headroom_mb',
+                                           fallback=DEFAULT_DISK_HEADROOM_MB),
+            trace_dir=os.path.expanduser(config.get('TRACE', 'dir', fallback='')),
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """从序列化结果还原, 忽略未知字段"""
+        known = {f.name for f in fields(cls)}
+        values = {k: v for k, v in data.items() if k in known}
+        if 'output_formats' in values:
+            values['output_formats'] = tuple(values['output_formats'])
+        if 'priorities' in values:
+            values['priorities'] = tuple(tuple(p) for p in values['priorities'])
+        return cls(**values)
+
+    def to_dict(self):
+        """序列化为可写入JSON的字典"""
+        data = asdict(self)
+        data['output_formats'] = list(self.output_formats)
+        data['priorities'] = [list(p) for p in self.priorities]
+        return data
+
+
+def parse_priorities(text):
+    """解析形如 "12345:10, 67890:5" 的杂志优先级配置"""
+    priorities = []
+    for item in text.split(','):
+        magazine_id, sep, priority = item.strip().rpartition(':')
+        if sep and magazine_id and priority.strip().lstrip('-').isdigit():
+            priorities.append((magazine_id.strip(), int(priority)))
+    return tuple(priorities)
+
+
+# 时间线记录的环形缓冲区容量(事件数)
+TRACE_BUFFER_SIZE = 100000
+
+
+class _TraceSpan:
+    """单个阶段的计时上下文"""
+
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.record(self.name, self.start, end - self.start, self.args)
+        return False
+
+
+class Tracer:
+    """记录各阶段的起止时间并导出为Chrome/Perfetto trace JSON
+
+    事件保存在定长环形缓冲区中, 超出容量时丢弃最早的事件。
+    未启用时span()返回空上下文, 几乎没有开销。
+    导出的时间戳为Unix纪元微秒, 多个进程或节点的时间线可以直接对齐。
+    start()/stop()按引用计数配对, 重叠的拉取和批处理记录在同一份时间线中,
+    由最后一个stop()导出。
+    """
+
+    _null_span = nullcontext()
+
+    def __init__(self, capacity=TRACE_BUFFER_SIZE):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.users = 0
+        self.events = deque(maxlen=capacity)
+        self.thread_names = {}
+        self.recorded = 0
+        self.origin = time.perf_counter_ns()
+        self.epoch_origin = time.time_ns()
+
+    def start(self):
+        """开始记录或加入正在进行的记录, 返回True, 须与stop()成对调用"""
+        with self.lock:
+            self.users += 1
+            if self.enabled:
+                return True
+            self.events.clear()
+            self.thread_names.clear()
+            self.recorded = 0
+            # 同时记录单调时钟和墙上时钟的起点, 导出时换算为纪元时间
+            self.origin = time.perf_counter_ns()
+            self.epoch_origin = time.time_ns()
+            self.enabled = True
+            return True
+
+    def span(self, name, **args):
+        """返回记录一个阶段的上下文管理器, args会作为事件参数导出"""
+        if not self.enabled:
+            return self._null_span
+        return _TraceSpan(self, name, args)
+
+    def record(self, name, start_ns, duration_ns, args):
+        """记录一个已完成的阶段"""
+        thread = threading.current_thread()
+        self.thread_names.setdefault(thread.ident, thread.name)
+        self.events.append((name, thread.ident, start_ns, duration_ns, args))
+        self.recorded += 1
+
+    def stop(self, trace_dir):
+        """结束一次记录, 最后一个使用者停止记录并导出到trace_dir
+
+        返回导出的文件路径, 仍有其他使用者时返回None。
+        """
+        with self.lock:
+            self.users = max(0, self.users - 1)
+            if self.users:
+                return None
+            self.enabled = False
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+            dropped = self.recorded - len(events)
+            offset = self.epoch_origin - self.origin
+
+        pid = os.getpid()
+        trace_events = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+                         'args': {'name': f'BooKanTool ({socket.gethostname()})'}}]
+        trace_events.extend({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                             'args': {'name': name}}
+                            for tid, name in thread_names.items())
+        trace_events.extend({'name': name, 'cat': 'stage', 'ph': 'X', 'pid': pid,
+                             'tid': tid, 'ts': (start + offset) / 1000,
+                             'dur': duration / 1000, 'args': args}
+                            for name, tid, start, duration, args in events)
+
+        os.makedirs(trace_dir, exist_ok=True)
+        trace_path = os.path.join(
+            trace_dir, f'trace-{time.strftime("%Y%m%d-%H%M%S")}-{pid}.json')
+        with open(f'{trace_path}.part', 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms',
+                       'otherData': {'dropped_events': dropped}},
+                      f, ensure_ascii=False)
+        os.replace(f'{trace_path}.part', trace_path)
+        logging.info('时间线已导出: %s', trace_path)
+        return trace_path
+
+
+# 全局时间线记录器
+TRACER = Tracer()
+
+
 class WindowManager:
     """管理应用程序主窗口和UI组件的类"""
 
@@ -196,12 +476,19 @@ class WindowManager:
 
         # 配置相关属性
         self.config_file = 'preferences.cfg'
-        self.source_dir = os.path.expanduser('~/Documents/magazine_images')
-        self.target_dir = os.path.expanduser('~/Documents/Books/magazine_pdfs')
+        self.preferences = PreferencesStore(self.config_file)
+        self.source_dir = os.path.expanduser(DEFAULT_SOURCE_DIR)
+        self.target_dir = os.path.expanduser(DEFAULT_TARGET_DIR)
+
+        # 页面预览缩略图缓存(跨预览窗口共享)
+        self.preview_cache = None
+
+        # 输出格式(PDF / CBZ / PDF+CBZ)
+        self.output_format = 'PDF'
 
         # ADB配置属性
-        self.adb_port = '7555'
-        self.emulator_path = '/sdcard/Android/data/cn.com.bookan/files/bookan/magazine'
+        self.adb_port = DEFAULT_ADB_PORT
+        self.emulator_path = DEFAULT_EMULATOR_PATH
 
         # 加载配置
         self.load_preferences()
@@ -278,6 +565,10 @@ class WindowManager:
             self.button_frame, text='配置路径', command=self.open_config_dialog)
         btn_config.pack(side=tk.LEFT, padx=5, expand=True, fill=tk.X)
 
+        btn_preview = ModernButton(
+            self.button_frame, text='页面预览', command=self.open_preview_window)
+        btn_preview.pack(side=tk.LEFT, padx=5, expand=True, fill=tk.X)
+
         btn_quit = ModernButton(
             self.button_frame, text='退出程序', command=self.on_close)
         btn_quit.pack(side=tk.LEFT, padx=5, expand=True, fill=tk.X)
@@ -340,6 +631,22 @@ class WindowManager:
             target_frame, text='浏览', command=self.browse_target_dir)
         btn_target.pack(side=tk.LEFT, padx=5)
 
+        # 输出格式配置
+        format_frame = ttk.Frame(output_frame)
+        format_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(format_frame, text='输出格式:', style='Modern.TLabel').pack(
+            side=tk.LEFT, padx=5)
+
+        self.format_combo = ModernCombobox(
+            format_frame,
+            values=list(OUTPUT_FORMAT_CHOICES),
+            state='readonly'
+        )
+        self.format_combo.set(self.output_format)
+        self.format_combo.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        self.format_combo.bind('<<ComboboxSelected>>', self.on_format_selected)
+
         # 处理按钮
         btn_process = ModernButton(
             self.main_container, text='开始处理', command=self.process_all)
@@ -367,8 +674,9 @@ class WindowManager:
         # 设置终止标志
         self.should_exit = True
 
-        # 保存窗口几何信息
+        # 保存窗口几何信息, 并立即写入尚未保存的配置
         self.save_preferences()
+        self.preferences.flush()
 
         # 强制终止所有后台线程
         for thread in threading.enumerate():
@@ -439,12 +747,25 @@ class WindowManager:
             self.adb_port = port
             self.save_preferences()
 
+    def on_format_selected(self, event=None):
+        """输出格式选择事件处理"""
+        self.output_format = self.format_combo.get()
+        self.save_preferences()
+        self.root.focus_set()
+
     def adb_pull_and_process(self):
-        """执行ADB复制并自动处理文件"""
-        self.adb_pull()
+        """执行ADB复制并自动处理文件, 拉取和转换记录在同一份时间线中"""
+        trace_dir = self.build_job_spec().trace_dir
+        tracing = bool(trace_dir) and TRACER.start()
+        try:
+            self.adb_pull()
 
-        # ADB复制完成后自动处理文件
-        self.process_all()
+            # ADB复制完成后自动处理文件, 已在后台线程中, 直接执行
+            batch_process(self.build_job_spec(), self.update_status,
+                          self.update_progress)
+        finally:
+            if tracing:
+                TRACER.stop(trace_dir)
 
     def browse_emulator_path(self):
         """浏览模拟器路径"""
@@ -462,19 +783,23 @@ class WindowManager:
 
     def load_preferences(self):
         """加载用户偏好设置"""
-        config = configparser.ConfigParser()
         if os.path.exists(self.config_file):
-            config.read(self.config_file)
+            config = self.preferences.load()
 
             if config.has_section('ADB'):
-                self.adb_port = config.get('ADB', 'port', fallback='7555')
+                self.adb_port = config.get('ADB', 'port', fallback=DEFAULT_ADB_PORT)
                 self.emulator_path = config.get('ADB', 'emulator_path',
-                                                fallback='/sdcard/Android/data/cn.com.bookan/files/bookan/magazine')
+                                                fallback=DEFAULT_EMULATOR_PATH)
 
             self.source_dir = os.path.expanduser(config.get('LOCAL', 'source_dir',
-                                                            fallback='~/Documents/magazine_images'))
+                                                            fallback=DEFAULT_SOURCE_DIR))
             self.target_dir = os.path.expanduser(config.get('LOCAL', 'target_dir',
-                                                            fallback='~/Documents/Books/magazine_pdfs'))
+                                                            fallback=DEFAULT_TARGET_DIR))
+
+            if config.has_section('OUTPUT'):
+                output_format = config.get('OUTPUT', 'format', fallback='PDF')
+                if output_format in OUTPUT_FORMAT_CHOICES:
+                    self.output_format = output_format
 
             # 加载窗口几何信息
             if config.has_section('WINDOW'):
@@ -494,7 +819,9 @@ class WindowManager:
 
     def save_preferences(self):
         """保存用户偏好设置"""
+        # 保留界面不管理的配置节(如SCHEDULER)
         config = configparser.ConfigParser()
+        config.read_dict(self.preferences.load())
         config['LOCAL'] = {
             'source_dir': self.source_dir.replace(os.path.expanduser('~'), '~', 1),
             'target_dir': self.target_dir.replace(os.path.expanduser('~'), '~', 1)
@@ -504,14 +831,18 @@ class WindowManager:
             'emulator_path': self.entry_emu_path.get()
         }
 
+        # 只更新界面管理的输出格式, 保留thumbnail_quality等手动配置项
+        if not config.has_section('OUTPUT'):
+            config.add_section('OUTPUT')
+        config['OUTPUT']['format'] = self.output_format
+
         # 保存窗口几何信息
         config['WINDOW'] = {
             'geometry': self.root.geometry(),
             'position': self.root.geometry()  # 包含位置信息
         }
 
-        with open(self.config_file, 'w', encoding='utf-8') as configfile:
-            config.write(configfile)
+        self.preferences.save(config)
 
     def show_error_message(self, title, message):
         """显示自定义错误消息框，以主窗口为中心"""
@@ -620,6 +951,20 @@ class WindowManager:
         # 窗口居中
         self.center_window_on_parent(config_dialog, 500, 200)
 
+    def open_preview_window(self):
+        """打开页面预览窗口"""
+        if self.preview_cache is None:
+            # 磁盘缓存默认关闭, 可在配置文件的PREVIEW节开启
+            config = self.preferences.load()
+            cache_dir = None
+            if config.getboolean('PREVIEW', 'disk_cache', fallback=False):
+                cache_dir = os.path.join(self.source_dir, PREVIEW_CACHE_DIR)
+            self.preview_cache = PageThumbnailCache(
+                cache_dir=cache_dir,
+                disk_max_bytes=config.getint('PREVIEW', 'disk_cache_mb',
+                                             fallback=PREVIEW_DISK_CACHE_MB) * 1024 * 1024)
+        PagePreviewWindow(self, self.preview_cache)
+
     def save_config(self, source_dir, target_dir, dialog):
         """保存配置"""
         self.source_dir = source_dir
@@ -655,16 +1000,17 @@ class WindowManager:
             self.update_progress(30)
 
             # 使用CREATE_NO_WINDOW标志防止弹出命令提示符窗口
-            result = subprocess.run(
-                f'adb connect 127.0.0.1:{self.adb_port}',
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                errors='ignore',
-                timeout=10,
-                check=True,
-                creationflags=subprocess.CREATE_NO_WINDOW  # 不显示命令提示符窗口
-            )
+            with TRACER.span('adb_connect', port=self.adb_port):
+                result = subprocess.run(
+                    f'adb connect 127.0.0.1:{self.adb_port}',
+                    capture_output=True,
+                    text=True,
+                    encoding='utf-8',
+                    errors='ignore',
+                    timeout=10,
+                    check=True,
+                    creationflags=ADB_CREATION_FLAGS  # 不显示命令提示符窗口
+                )
             output = result.stdout or ''
 
             if 'connected' in output:
@@ -687,43 +1033,125 @@ class WindowManager:
                 pass
 
     def adb_pull(self):
-        """执行ADB文件拉取"""
+        """按磁盘剩余空间逐本拉取杂志
+
+        先列出设备上每本杂志的大小, 只在暂存目录和输出目录都留有余量时拉取;
+        空间不足时优先拉取放得下的较小杂志, 仍不足则先转换已拉取的杂志释放空间。
+        无法列出设备目录时退回整体拉取。
+        """
         self.save_preferences()
         self.update_status("ADB复制启动...")
         self.update_progress(10)
-
+        job_spec = self.build_job_spec()
+        tracing = bool(job_spec.trace_dir) and TRACER.start()
         try:
-            # 先建立连接
-            self.adb_connect()
-            self.update_progress(20)
+            self.pull_magazines(job_spec)
+        finally:
+            if tracing:
+                TRACER.stop(job_spec.trace_dir)
 
-            # 执行pull命令，使用CREATE_NO_WINDOW标志
-            process = subprocess.Popen(
-                f'adb pull {self.entry_emu_path.get()} "{self.source_dir}"',
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                encoding='utf-8',
-                errors='ignore',
-                creationflags=subprocess.CREATE_NO_WINDOW  # 不显示命令提示符窗口
-            )
+    def pull_magazines(self, job_spec):
+        """逐本拉取的主循环"""
+        self.adb_connect()
+        self.update_progress(20)
 
-            # 实时更新进度
-            progress = 20
-            # Bug修复：检查 process.stdout 是否为 None
-            if process.stdout is not None:
-                for line in iter(process.stdout.readline, ''):
-                    self.update_status(line.strip())
-                    logging.info(line.strip())
+        magazines = list_device_magazines(job_spec)
+        if magazines is None:
+            self.adb_pull_directory()
+            return
+
+        Path(job_spec.source_dir).mkdir(parents=True, exist_ok=True)
+        Path(job_spec.target_dir).mkdir(parents=True, exist_ok=True)
+        publish_report = PublishReport()
+        thumbnail_worker = ThumbnailWorker()
+        pending = list(magazines)
+        total = len(pending)
+        pulled = failed = 0
+        stalled_rounds = 0
+        skipped = []
+
+        while pending and not self.should_exit:
+            staged = staged_bytes(job_spec)
+            magazine = next((m for m in pending
+                             if has_space_for(job_spec, m.size_bytes, staged)), None)
+            if magazine is None:
+                if staged == 0:
+                    # 暂存目录已空仍放不下, 等待也不会释放空间
+                    skipped = pending
+                    break
+                # 空间不足: 先转换已拉取的杂志, 转换后会清理暂存文件
+                self.update_status('磁盘空间不足, 先处理已拉取的杂志...')
+                if process_pending(job_spec, self.update_status, None,
+                                   publish_report, thumbnail_worker):
+                    stalled_rounds = 0
+                    continue
+                # 已拉取的杂志转换失败时不会释放空间, 限制等待轮数
+                stalled_rounds += 1
+                if stalled_rounds >= PULL_MAX_STALLED_ROUNDS:
+                    skipped = pending
+                    break
+                self.update_status(
+                    f'等待磁盘空间: 还需拉取 {len(pending)} 本杂志')
+                time.sleep(PULL_SPACE_POLL_INTERVAL)
+                continue
+
+            stalled_rounds = 0
+            pending.remove(magazine)
+            self.update_status(f'正在拉取: {magazine.magazine_id} '
+                               f'({magazine.size_bytes // (1024 * 1024)} MB)')
+            if pull_device_magazine(job_spec, magazine.magazine_id):
+                pulled += 1
+            else:
+                failed += 1
+            self.update_progress(20 + 80 * (pulled + failed) / total)
+
+        thumbnail_worker.wait()
+        if skipped:
+            failed += len(skipped)
+            names = ', '.join(m.magazine_id for m in skipped)
+            logging.error('磁盘空间不足, 未拉取: %s', names)
+            self.update_progress(100)
+            self.update_status(f'文件同步完成: 成功 {pulled} 本, 失败 {failed} 本 '
+                               f'(磁盘空间不足, 未拉取: {names})')
+        else:
+            self.update_status(f'文件同步完成: 成功 {pulled} 本, 失败 {failed} 本')
+        try:
+            if hasattr(self, 'root') and self.root.winfo_exists() and threading.current_thread() is not threading.main_thread():
+                self.root.after(2000, lambda: self.update_progress(0))
+        except RuntimeError:
+            pass
 
+    def adb_pull_directory(self):
+        """整体拉取模拟器目录"""
+        try:
+            # 执行pull命令，使用CREATE_NO_WINDOW标志
+            with TRACER.span('adb_pull', path=self.entry_emu_path.get()):
+                process = subprocess.Popen(
+                    f'adb pull {self.entry_emu_path.get()} "{self.source_dir}"',
+                    shell=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    encoding='utf-8',
+                    errors='ignore',
+                    creationflags=ADB_CREATION_FLAGS  # 不显示命令提示符窗口
+                )
+
+                # 实时更新进度
+                progress = 20
+                # Bug修复：检查 process.stdout 是否为 None
+                if process.stdout is not None:
+                    for line in iter(process.stdout.readline, ''):
+                        self.update_status(line.strip())
+                        logging.info(line.strip())
+
+                        # 模拟进度更新
+                        progress = min(progress + 5, 90)
+                        self.update_progress(progress)
                     # 模拟进度更新
                     progress = min(progress + 5, 90)
                     self.update_progress(progress)
-                # 模拟进度更新
-                progress = min(progress + 5, 90)
-                self.update_progress(progress)
 
-            process.wait()
+                process.wait()
             # Bug修复：检查 process.stdout 是否为 None
             if process.stdout is not None:
                 output = process.stdout.read() or ''
@@ -749,68 +1177,710 @@ class WindowManager:
             except RuntimeError:
                 pass
 
+    def build_job_spec(self):
+        """根据当前界面设置构建任务规格, 调度等其他设置取自配置文件"""
+        return replace(
+            JobSpec.from_config(self.preferences.load()),
+            source_dir=self.source_dir,
+            target_dir=self.target_dir,
+            output_formats=OUTPUT_FORMAT_CHOICES[self.output_format],
+            adb_port=self.adb_port,
+            emulator_path=self.entry_emu_path.get()
+        )
+
     def process_all(self):
         """处理所有文件"""
+        job_spec = self.build_job_spec()
         Thread(target=lambda: batch_process(
-            self.source_dir,
-            self.target_dir,
+            job_spec,
             self.update_status,
             self.update_progress
         )).start()
 
 
-def batch_process(source_dir, target_dir, status_callback, progress_callback=None):
+# 页面预览配置
+PREVIEW_THUMB_SIZE = 160
+PREVIEW_CELL_PADDING = 10
+PREVIEW_LABEL_HEIGHT = 20
+PREVIEW_CACHE_BYTES = 64 * 1024 * 1024
+PREVIEW_CACHE_DIR = '.preview_cache'
+PREVIEW_DISK_CACHE_MB = 256
+PREVIEW_DISK_PRUNE_INTERVAL = 32  # 每写入多少个文件检查一次磁盘缓存大小
+
+
+class PageThumbnailCache:
+    """按内存上限淘汰的页面缩略图LRU缓存, 可选磁盘缓存(线程安全)
+
+    磁盘缓存以文件修改时间作为最近使用时间, 超过容量上限时删除最久未用的文件。
+    """
+
+    def __init__(self, max_bytes=PREVIEW_CACHE_BYTES, cache_dir=None,
+                 disk_max_bytes=PREVIEW_DISK_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.disk_writes = 0
+        if self.cache_dir:
+            self.prune_disk()
+
+    def get(self, key):
+        """读取缓存的缩略图, 返回(image, status)或None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, image, status):
+        """写入缩略图, 超过内存上限时淘汰最久未使用的条目"""
+        size = _image_nbytes(image)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= _image_nbytes(old[0])
+            self.entries[key] = (image, status)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.current_bytes -= _image_nbytes(evicted)
+
+    def disk_path(self, key):
+        """返回磁盘缓存路径, 未启用磁盘缓存时返回None"""
+        if not self.cache_dir:
+            return None
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{name}.jpg')
+
+    def load_disk(self, key):
+        """从磁盘缓存读取缩略图, 未命中返回None"""
+        disk_path = self.disk_path(key)
+        if not disk_path or not os.path.exists(disk_path):
+            return None
+        try:
+            with Image.open(disk_path) as img:
+                img.load()
+                thumb = img.convert('RGB')
+            os.utime(disk_path)  # 标记为最近使用
+            return thumb
+        except (OSError, UnidentifiedImageError):
+            return None
+
+    def store_disk(self, key, thumb):
+        """写入磁盘缓存, 定期按容量上限清理"""
+        disk_path = self.disk_path(key)
+        if not disk_path:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            thumb.save(disk_path, 'JPEG', quality=80)
+        except OSError as cache_error:
+            logging.error('写入预览缓存失败: %s', cache_error)
+            return
+
+        with self.lock:
+            self.disk_writes += 1
+            should_prune = self.disk_writes % PREVIEW_DISK_PRUNE_INTERVAL == 0
+        if should_prune:
+            self.prune_disk()
+
+    def prune_disk(self):
+        """删除最久未使用的缓存文件, 直到总大小不超过上限"""
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                files = [(e.stat().st_mtime, e.stat().st_size, e.path)
+                         for e in entries if e.is_file()]
+        except OSError:
+            return
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def _image_nbytes(image):
+    """估算图像占用的内存字节数"""
+    if image is None:
+        return 0
+    return image.width * image.height * len(image.getbands())
+
+
+def magazine_page_paths(source_dir, magazine_id):
+    """按TXT顺序返回杂志页面路径, 兼容已重命名为0001.jpg形式的文件"""
+    txt_path = os.path.join(source_dir, f'{magazine_id}.txt')
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()]
+
+    pages = []
+    for index, line in enumerate(lines, 1):
+        orig_path = os.path.join(source_dir, magazine_id, line.split('/')[-1])
+        renamed_path = os.path.join(source_dir, magazine_id, f"{index:04d}.jpg")
+        pages.append(renamed_path if os.path.exists(renamed_path) else orig_path)
+    return pages
+
+
+def load_page_thumbnail(path, cache, size=PREVIEW_THUMB_SIZE):
+    """加载页面缩略图, 返回(image, status)
+
+    status取值: ok / blank(近似纯色页) / error(损坏或截断) / missing(文件不存在)。
+    使用JPEG draft模式以缩小比例解码, 结果写入内存缓存和可选的磁盘缓存。
+    """
+    if not os.path.exists(path):
+        return None, 'missing'
+
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns, size)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    thumb = cache.load_disk(key)
+    if thumb is None:
+        try:
+            with Image.open(path) as img:
+                img.draft('RGB', (size, size))
+                thumb = img.convert('RGB')
+            thumb.thumbnail((size, size), Image.Resampling.BILINEAR)
+        except (OSError, UnidentifiedImageError, ValueError):
+            cache.put(key, None, 'error')
+            return None, 'error'
+
+        cache.store_disk(key, thumb)
+
+    low, high = thumb.convert('L').getextrema()
+    status = 'blank' if high - low < 8 else 'ok'
+    cache.put(key, thumb, status)
+    return thumb, status
+
+
+class PagePreviewWindow:
+    """虚拟化的页面缩略图网格, 仅为可见区域解码和创建图像"""
+
+    def __init__(self, manager, cache):
+        self.manager = manager
+        self.cache = cache
+        self.pages = []
+        self.photos = {}
+        self.pending = set()
+        self.visible = set()
+        self.generation = 0
+        self.render_job = None
+        self.executor = ThreadPoolExecutor(max_workers=2,
+                                           thread_name_prefix='preview')
+
+        self.window = tk.Toplevel(manager.root)
+        self.window.title('页面预览')
+        try:
+            self.window.iconbitmap('app_icon.ico')
+        except tk.TclError:
+            pass
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        # 杂志选择
+        top_frame = ttk.Frame(self.window, padding=10)
+        top_frame.pack(fill=tk.X)
+        ttk.Label(top_frame, text='杂志:', style='Modern.TLabel').pack(
+            side=tk.LEFT, padx=5)
+        self.magazine_combo = ModernCombobox(top_frame, state='readonly',
+                                             values=self.list_magazines())
+        self.magazine_combo.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        self.magazine_combo.bind('<<ComboboxSelected>>', self.on_magazine_selected)
+        self.info_label = ttk.Label(top_frame, text='', style='Modern.TLabel')
+        self.info_label.pack(side=tk.LEFT, padx=5)
+
+        # 缩略图画布
+        grid_frame = ttk.Frame(self.window)
+        grid_frame.pack(fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(grid_frame, background=COLOR_LIGHT,
+                                highlightthickness=0)
+        scrollbar = ttk.Scrollbar(grid_frame, orient=tk.VERTICAL,
+                                  command=self.on_scrollbar)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.canvas.bind('<Configure>', lambda e: self.layout())
+        self.canvas.bind('<MouseWheel>', self.on_mousewheel)
+        self.canvas.bind('<Button-4>', lambda e: self.scroll_units(-3))
+        self.canvas.bind('<Button-5>', lambda e: self.scroll_units(3))
+
+        manager.center_window_on_parent(self.window, 900, 640)
+
+        if self.magazine_combo['values']:
+            self.magazine_combo.current(0)
+            self.on_magazine_selected()
+
+    def list_magazines(self):
+        """列出源目录中待处理的杂志"""
+        try:
+            files = sorted(os.listdir(self.manager.source_dir))
+        except OSError:
+            return []
+        return [f[:-4] for f in files if f.endswith('.txt')]
+
+    def on_magazine_selected(self, event=None):
+        """切换杂志时重置网格"""
+        magazine_id = self.magazine_combo.get()
+        self.generation += 1
+        self.photos.clear()
+        self.pending.clear()
+        try:
+            self.pages = magazine_page_paths(self.manager.source_dir, magazine_id)
+        except OSError as e:
+            self.pages = []
+            self.info_label.config(text=f'读取失败: {e}')
+        else:
+            missing = sum(1 for p in self.pages if not os.path.exists(p))
+            self.info_label.config(text=f'共 {len(self.pages)} 页, 缺失 {missing} 页')
+        self.canvas.yview_moveto(0)
+        self.layout()
+
+    def cell_size(self):
+        """返回网格单元的宽高"""
+        width = PREVIEW_THUMB_SIZE + PREVIEW_CELL_PADDING * 2
+        return width, width + PREVIEW_LABEL_HEIGHT
+
+    def columns(self):
+        """根据画布宽度计算列数"""
+        cell_w, _ = self.cell_size()
+        return max(1, self.canvas.winfo_width() // cell_w)
+
+    def layout(self):
+        """更新滚动区域并重绘可见单元"""
+        _, cell_h = self.cell_size()
+        rows = -(-len(self.pages) // self.columns())
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(),
+                                            rows * cell_h))
+        self.schedule_render()
+
+    def on_scrollbar(self, *args):
+        """滚动条拖动"""
+        self.canvas.yview(*args)
+        self.schedule_render()
+
+    def on_mousewheel(self, event):
+        """鼠标滚轮滚动"""
+        self.scroll_units(int(-event.delta / 120) * 3)
+
+    def scroll_units(self, units):
+        """按单位滚动画布"""
+        self.canvas.yview_scroll(units, 'units')
+        self.schedule_render()
+
+    def schedule_render(self):
+        """合并短时间内的多次重绘请求"""
+        if self.render_job is None:
+            self.render_job = self.window.after(16, self.render)
+
+    def render(self):
+        """仅绘制可见范围内的单元, 并释放不可见页面的图像"""
+        self.render_job = None
+        cell_w, cell_h = self.cell_size()
+        cols = self.columns()
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = int(top // cell_h) * cols
+        last = min(len(self.pages), (int(bottom // cell_h) + 1) * cols)
+        self.visible = set(range(first, last))
+
+        for index in list(self.photos):
+            if index not in self.visible:
+                del self.photos[index]
+
+        self.canvas.delete('cell')
+        for index in range(first, last):
+            row, col = divmod(index, cols)
+            x = col * cell_w + PREVIEW_CELL_PADDING
+            y = row * cell_h + PREVIEW_CELL_PADDING
+            self.draw_cell(index, x, y)
+
+    def draw_cell(self, index, x, y):
+        """绘制单个页面单元, 缩略图未就绪时提交后台解码"""
+        path = self.pages[index]
+        entry = self.photos.get(index)
+        if entry is None:
+            thumb, status = self.lookup_cached(path)
+            if status is not None:
+                photo = ImageTk.PhotoImage(thumb) if thumb is not None else None
+                entry = self.photos[index] = (photo, status)
+            else:
+                self.request_thumbnail(index, path)
+
+        status = entry[1] if entry is not None else 'loading'
+        color = {'ok': COLOR_DARK, 'loading': COLOR_PRIMARY,
+                 'blank': COLOR_WARNING}.get(status, COLOR_DANGER)
+        size = PREVIEW_THUMB_SIZE
+        self.canvas.create_rectangle(x, y, x + size, y + size, outline=color,
+                                     tags='cell')
+        if entry is not None and entry[0] is not None:
+            self.canvas.create_image(x + size // 2, y + size // 2,
+                                     image=entry[0], tags='cell')
+        label = f'{index + 1:04d}' + {'blank': ' 空白', 'error': ' 损坏',
+                                       'missing': ' 缺失'}.get(status, '')
+        self.canvas.create_text(x + size // 2, y + size + PREVIEW_LABEL_HEIGHT // 2,
+                                text=label, fill=color, tags='cell')
+
+    def lookup_cached(self, path):
+        """仅从内存缓存读取, 未命中返回(None, None)"""
+        if not os.path.exists(path):
+            return None, 'missing'
+        stat = os.stat(path)
+        cached = self.cache.get((path, stat.st_size, stat.st_mtime_ns,
+                                 PREVIEW_THUMB_SIZE))
+        return cached if cached is not None else (None, None)
+
+    def request_thumbnail(self, index, path):
+        """提交后台解码任务"""
+        if index in self.pending:
+            return
+        self.pending.add(index)
+        generation = self.generation
+        self.executor.submit(self.load_thumbnail, index, path, generation)
+
+    def load_thumbnail(self, index, path, generation):
+        """后台线程: 解码缩略图后通知主线程重绘"""
+        # 已滚出可见区域或已切换杂志的任务直接放弃
+        if generation != self.generation or index not in self.visible:
+            self.pending.discard(index)
+            return
+        try:
+            load_page_thumbnail(path, self.cache)
+        except OSError as e:
+            logging.error('加载预览失败 %s: %s', path, e)
+        try:
+            self.window.after(0, lambda: self.on_thumbnail_ready(index, generation))
+        except (RuntimeError, tk.TclError):  # 窗口已关闭
+            pass
+
+    def on_thumbnail_ready(self, index, generation):
+        """主线程: 缩略图就绪后重绘"""
+        if generation != self.generation:
+            return
+        self.pending.discard(index)
+        if index in self.visible:
+            self.schedule_render()
+
+    def close(self):
+        """关闭窗口并停止后台任务"""
+        self.generation += 1
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.photos.clear()
+        self.window.destroy()
+
+
+def batch_process(job_spec, status_callback, progress_callback=None):
     """批量处理监控目录中的杂志文件"""
     check_interval = 30
+    publish_report = PublishReport()
+    thumbnail_worker = ThumbnailWorker()
+    tracing = bool(job_spec.trace_dir) and TRACER.start()
 
-    while True:
-        processed = False
-        files = os.listdir(source_dir)
-        total_files = len([f for f in files if f.endswith('.txt')])
-
-        for i, filename in enumerate(files):
-            if filename.endswith('.txt'):
-                magazine_id = filename[:-4]
-                try:
-                    status_callback(f'正在处理: {magazine_id}')
-                    if progress_callback:
-                        progress_callback((i / total_files) * 100)
-
-                    main_processor(source_dir, target_dir, magazine_id)
-                    processed = True
-
-                    if progress_callback:
-                        progress_callback(((i + 1) / total_files) * 100)
-                except (OSError, ValueError, IOError) as processing_error:
-                    logging.error('处理失败: %s', processing_error)
-                    status_callback(f'处理失败: {str(processing_error)}')
-                    if progress_callback:
-                        progress_callback(0)
-
-        if not processed:
-            status_callback('等待新文件...')
+    try:
+        while True:
+            processed = process_pending(job_spec, status_callback, progress_callback,
+                                        publish_report, thumbnail_worker)
+
+            if not processed:
+                status_callback('等待新文件...')
+                if progress_callback:
+                    progress_callback(0)
+                time.sleep(check_interval)
+            else:
+                with TRACER.span('thumbnail_wait'):
+                    thumbnail_worker.wait()
+                logging.info('文件发布统计: %s', publish_report.summary())
+                status_callback(f'处理完成, {publish_report.summary()}')
+                break
+    finally:
+        if tracing:
+            TRACER.stop(job_spec.trace_dir)
+
+
+def process_pending(job_spec, status_callback, progress_callback=None,
+                    publish_report=None, thumbnail_worker=None):
+    """调度处理源目录中当前所有待处理杂志, 返回成功处理的数量"""
+    scheduler = BatchScheduler(job_spec.max_workers, job_spec.memory_budget_mb,
+                               dict(job_spec.priorities))
+    files = os.listdir(job_spec.source_dir)
+    costs = [estimate_job_cost(job_spec, f[:-4])
+             for f in files if f.endswith('.txt')]
+    total_files = len(costs)
+    state = {'processed': 0, 'finished': 0}
+    state_lock = threading.Lock()
+
+    def process_one(magazine_id):
+        try:
+            status_callback(f'正在处理: {magazine_id}')
+            with TRACER.span('process', magazine_id=magazine_id):
+                main_processor(job_spec, magazine_id,
+                               publish_report, thumbnail_worker)
+            with state_lock:
+                state['processed'] += 1
+        except Exception as processing_error:  # 如img2pdf.ImageOpenError, 不能在线程池中静默丢失
+            logging.exception('处理失败 %s: %s', magazine_id, processing_error)
+            status_callback(f'处理失败: {magazine_id}: {processing_error}')
+        finally:
+            with state_lock:
+                state['finished'] += 1
+                finished = state['finished']
             if progress_callback:
-                progress_callback(0)
-            time.sleep(check_interval)
-        else:
-            break
+                progress_callback((finished / total_files) * 100)
+
+    scheduler.run(costs, process_one)
+    return state['processed']
+
+
+# 拉取时磁盘空间不足的等待间隔(秒)
+PULL_SPACE_POLL_INTERVAL = 30
+# 已拉取的杂志连续多少轮转换不出结果后放弃剩余杂志
+PULL_MAX_STALLED_ROUNDS = 10
+# 隐藏ADB命令窗口(仅Windows有效)
+ADB_CREATION_FLAGS = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+
+@dataclass(frozen=True)
+class DeviceMagazine:
+    """设备上的一本杂志及其大小"""
 
+    magazine_id: str
+    size_bytes: int
+
+
+def list_device_magazines(job_spec):
+    """列出设备目录中带TXT清单的杂志及其大小, 按设备顺序返回
+
+    通过 du 统计每个条目大小, 命令失败或目录中没有TXT清单时返回None。
+    """
+    try:
+        with TRACER.span('adb_list', path=job_spec.emulator_path):
+            result = subprocess.run(
+                ['adb', 'shell', f'du -sk "{job_spec.emulator_path}"/*'],
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='ignore',
+                timeout=60,
+                check=True,
+                creationflags=ADB_CREATION_FLAGS
+            )
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.error('列出设备目录失败: %s', e)
+        return None
+
+    sizes = {}
+    manifests = []
+    for line in result.stdout.splitlines():
+        size_kb, _, path = line.strip().partition('\t')
+        if not size_kb.isdigit() or not path:
+            continue
+        name = path.rstrip('/').split('/')[-1]
+        magazine_id = name[:-4] if name.endswith('.txt') else name
+        if name.endswith('.txt'):
+            manifests.append(magazine_id)
+        sizes[magazine_id] = sizes.get(magazine_id, 0) + int(size_kb) * 1024
+
+    if not manifests:
+        return None
+    return [DeviceMagazine(m, sizes[m]) for m in manifests]
+
+
+def staged_bytes(job_spec):
+    """已拉取但尚未转换的杂志占用的字节数"""
+    try:
+        files = os.listdir(job_spec.source_dir)
+    except OSError:
+        return 0
+    return sum(estimate_job_cost(job_spec, f[:-4]).size_bytes
+               for f in files if f.endswith('.txt'))
+
+
+def has_space_for(job_spec, incoming_bytes, staged=None):
+    """判断暂存目录和输出目录是否能容纳新拉取的杂志及其转换结果
+
+    输出目录需要为已暂存和新拉取的杂志预留每种输出格式一份的空间,
+    两个目录在同一卷上时合并计算, 并各自保留配置的余量。
+    """
+    headroom = job_spec.disk_headroom_mb * 1024 * 1024
+    if staged is None:
+        staged = staged_bytes(job_spec)
+    output_bytes = ((staged + incoming_bytes)
+                    * max(1, len(job_spec.output_formats)))
+
+    source_stat = os.stat(job_spec.source_dir)
+    target_stat = os.stat(job_spec.target_dir)
+    source_free = shutil.disk_usage(job_spec.source_dir).free
+    if source_stat.st_dev == target_stat.st_dev:
+        return source_free >= incoming_bytes + output_bytes + headroom
+
+    target_free = shutil.disk_usage(job_spec.target_dir).free
+    return (source_free >= incoming_bytes + headroom
+            and target_free >= output_bytes + headroom)
+
+
+def pull_device_magazine(job_spec, magazine_id):
+    """拉取单本杂志: 先拉图片目录, 最后拉TXT清单
+
+    TXT清单出现即表示图片已完整, 失败时清理不完整的文件, 返回是否成功。
+    """
+    remote_dir = job_spec.emulator_path.rstrip('/')
+    local_folder = os.path.join(job_spec.source_dir, magazine_id)
+    local_txt = os.path.join(job_spec.source_dir, f'{magazine_id}.txt')
+    try:
+        for remote in (f'{remote_dir}/{magazine_id}', f'{remote_dir}/{magazine_id}.txt'):
+            with TRACER.span('adb_pull', magazine_id=magazine_id,
+                             path=remote.split('/')[-1]):
+                result = subprocess.run(
+                    ['adb', 'pull', remote, job_spec.source_dir],
+                    capture_output=True,
+                    text=True,
+                    encoding='utf-8',
+                    errors='ignore',
+                    check=False,
+                    creationflags=ADB_CREATION_FLAGS
+                )
+            logging.info(result.stdout.strip())
+            if result.returncode != 0:
+                raise OSError(result.stdout.strip() or result.stderr.strip())
+        return True
+    except OSError as pull_error:
+        logging.error('拉取失败 %s: %s', magazine_id, pull_error)
+        try:
+            if os.path.exists(local_txt):
+                os.remove(local_txt)
+            if os.path.exists(local_folder):
+                shutil.rmtree(local_folder)
+        except OSError as cleanup_error:
+            logging.error('清理不完整文件时出错: %s', cleanup_error)
+        return False
 
-def main_processor(source_dir, target_dir, magazine_id):
-    """主处理逻辑"""
-    config = configparser.ConfigParser()
-    config.read('preferences.cfg')
 
+# 成本估算: 每页的固定开销(字节)与仅输出CBZ时的流式内存占用
+PAGE_COST_BYTES = 64 * 1024
+STREAMING_MEMORY_BYTES = 16 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class JobCost:
+    """单本杂志的预估处理成本"""
+
+    magazine_id: str
+    pages: int
+    size_bytes: int
+    memory_bytes: int
+
+    @property
+    def work(self):
+        """用于排序的相对工作量"""
+        return self.size_bytes + self.pages * PAGE_COST_BYTES
+
+
+def estimate_job_cost(job_spec, magazine_id):
+    """根据TXT行数和图片目录大小估算处理成本"""
+    txt_path = os.path.join(job_spec.source_dir, f'{magazine_id}.txt')
+    try:
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            pages = sum(1 for line in f if line.strip())
+    except OSError:
+        pages = 0
+
+    size_bytes = 0
+    try:
+        with os.scandir(os.path.join(job_spec.source_dir, magazine_id)) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    size_bytes += entry.stat().st_size
+    except OSError:
+        pass
+
+    # img2pdf在内存中同时持有全部页面数据和生成的PDF
+    if 'pdf' in job_spec.output_formats:
+        memory_bytes = size_bytes * 2 + STREAMING_MEMORY_BYTES
+    else:
+        memory_bytes = STREAMING_MEMORY_BYTES
+    return JobCost(magazine_id, pages, size_bytes, memory_bytes)
+
+
+class BatchScheduler:
+    """成本感知的批处理调度器
+
+    按优先级和预估工作量(短作业优先)排序, 在CPU并发数和内存预算内准入任务。
+    队首任务超出剩余预算时允许后面放得下的任务先行; 没有任务运行时总是准入,
+    保证超出预算的单个任务也能执行。
+    """
+
+    def __init__(self, max_workers=0, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                 priorities=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.priorities = priorities or {}
+        self.condition = threading.Condition()
+        self.memory_in_use = 0
+        self.running = 0
+
+    def order(self, costs):
+        """优先级高的在前, 同优先级按工作量从小到大"""
+        return sorted(costs, key=lambda c: (-self.priorities.get(c.magazine_id, 0),
+                                            c.work, c.magazine_id))
+
+    def run(self, costs, process):
+        """按调度顺序执行process(magazine_id), 全部完成后返回"""
+        pending = self.order(costs)
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix='batch') as executor:
+            with self.condition:
+                while pending:
+                    job = self._next_admissible(pending)
+                    if job is None:
+                        with TRACER.span('admission_wait', running=self.running,
+                                         memory_mb=self.memory_in_use // (1024 * 1024)):
+                            self.condition.wait()
+                        continue
+                    pending.remove(job)
+                    self.memory_in_use += job.memory_bytes
+                    self.running += 1
+                    future = executor.submit(process, job.magazine_id)
+                    future.add_done_callback(
+                        lambda f, job=job: self._release(job, f))
+
+    def _next_admissible(self, pending):
+        """返回下一个可准入的任务, 没有时返回None"""
+        if self.running >= self.max_workers:
+            return None
+        if self.running == 0:
+            return pending[0]
+        for job in pending:
+            if self.memory_in_use + job.memory_bytes <= self.memory_budget:
+                return job
+        return None
+
+    def _release(self, job, future):
+        """任务结束后释放预算, 并记录process未处理的异常"""
+        error = future.exception()
+        if error is not None:
+            logging.error('任务异常结束 %s: %r', job.magazine_id, error)
+        with self.condition:
+            self.memory_in_use -= job.memory_bytes
+            self.running -= 1
+            self.condition.notify_all()
+
+
+def main_processor(job_spec, magazine_id, publish_report=None, thumbnail_worker=None,
+                   check_lease=None):
+    """主处理逻辑
+
+    check_lease用于转换节点: 在发布输出和清理源文件前调用, 租约丢失时抛出异常中止处理。
+    """
     # 配置路径
-    source_dir = config.get('LOCAL', 'source_dir',
-                            fallback=os.path.join(os.path.expanduser('~'),
-                                                  'Documents',
-                                                  'magazine_images'))
-    target_dir = config.get('LOCAL', 'target_dir',
-                            fallback=os.path.join(os.path.expanduser('~'),
-                                                  'Documents',
-                                                  'Books',
-                                                  'magazines_PDF'))
+    source_dir = job_spec.source_dir
+    target_dir = job_spec.target_dir
 
     # 自动创建目标目录
     Path(source_dir).mkdir(parents=True, exist_ok=True)
@@ -826,50 +1896,757 @@ def main_processor(source_dir, target_dir, magazine_id):
 
     # 按TXT顺序重命名文件
     renamed_files = []
-    with open(txt_path, 'r', encoding='utf-8') as f:
-        lines = [line.strip() for line in f.readlines()]
-
-    for index, line in enumerate(lines, 1):
-        orig_name = line.strip().split('/')[-1]
-        orig_path = os.path.join(source_dir, magazine_id, orig_name)
-        new_name = f"{index:04d}.jpg"
-        new_path = os.path.join(source_dir, magazine_id, new_name)
-
-        if os.path.exists(new_path):
-            continue
-        if os.path.exists(orig_path):
-            os.rename(orig_path, new_path)
-            renamed_files.append(new_path)
+    with TRACER.span('ordering', magazine_id=magazine_id):
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f.readlines()]
+
+        for index, line in enumerate(lines, 1):
+            orig_name = line.strip().split('/')[-1]
+            orig_path = os.path.join(source_dir, magazine_id, orig_name)
+            new_name = f"{index:04d}.jpg"
+            new_path = os.path.join(source_dir, magazine_id, new_name)
+
+            if os.path.exists(new_path):
+                # 上次处理中断时已重命名的页面, 重试时同样纳入输出
+                renamed_files.append(new_path)
+                continue
+            if os.path.exists(orig_path):
+                os.rename(orig_path, new_path)
+                renamed_files.append(new_path)
 
     # 创建数字命名的子文件夹
     output_folder = os.path.join(target_dir, magazine_id)
     os.makedirs(output_folder, exist_ok=True)
 
-    # 复制封面图片(001.jpg)到目标文件夹
+    # 按所选格式合成PDF/CBZ并保存到子文件夹
+    with TRACER.span('build_outputs', magazine_id=magazine_id,
+                     pages=len(renamed_files),
+                     formats=','.join(job_spec.output_formats)):
+        write_outputs(sorted(renamed_files), output_folder, magazine_id,
+                      job_spec.output_formats, publish_report, check_lease)
+
+    # 发布封面图片(0001.jpg)到目标文件夹; 不移动源文件, 清理前中断时重试仍能生成完整输出
     cover_path = os.path.join(source_dir, magazine_id, "0001.jpg")
     if os.path.exists(cover_path):
-        shutil.copy2(cover_path, os.path.join(output_folder, "cover.jpg"))
+        published_cover = os.path.join(output_folder, "cover.jpg")
+        if check_lease is not None:
+            check_lease()
+        with TRACER.span('cover_publish', magazine_id=magazine_id):
+            publish_file(cover_path, published_cover, report=publish_report)
 
-    # 合成PDF并保存到子文件夹
-    pdf_path = os.path.join(output_folder, f"{magazine_id}.pdf")
-    with open(pdf_path, "wb") as pdf_file:
-        pdf_file.write(img2pdf.convert(sorted(renamed_files)))
+        # 在后台线程池中生成封面缩略图, 不阻塞后续杂志的处理
+        if thumbnail_worker is not None:
+            thumbnail_worker.submit(published_cover, output_folder, publish_report,
+                                    job_spec.thumbnail_quality)
 
     # 清理源文件
+    if check_lease is not None:
+        check_lease()
+    with TRACER.span('cleanup', magazine_id=magazine_id):
+        try:
+            os.remove(txt_path)
+            if os.path.exists(img_folder):
+                shutil.rmtree(img_folder)
+        except (OSError, shutil.Error) as cleanup_error:
+            logging.error("清理文件时出错: %s", cleanup_error)
+            print(f"清理文件时出错: {cleanup_error}")
+
+
+# 界面输出格式选项与对应的输出文件类型
+OUTPUT_FORMAT_CHOICES = {
+    'PDF': ('pdf',),
+    'CBZ': ('cbz',),
+    'PDF+CBZ': ('pdf', 'cbz'),
+}
+
+
+def write_outputs(page_paths, output_folder, magazine_id, output_formats=('pdf',),
+                  publish_report=None, before_publish=None):
+    """按所选格式生成输出文件
+
+    同时输出PDF和CBZ时每个页面文件只读取一次, CBZ中的图片以存储方式写入,
+    不重新压缩。所有输出先写入唯一命名的.part临时文件, 完成后再发布;
+    before_publish在发布前调用, 可通过抛出异常放弃发布。
+    """
+    pdf_path = os.path.join(output_folder, f"{magazine_id}.pdf")
+    cbz_path = os.path.join(output_folder, f"{magazine_id}.cbz")
+    part_suffix = f"{uuid.uuid4().hex}.part"
+    pdf_part_path = f"{pdf_path}.{part_suffix}"
+    cbz_part_path = f"{cbz_path}.{part_suffix}"
+    pdf_pages = [] if 'pdf' in output_formats else None
+    write_cbz = 'cbz' in output_formats
+
     try:
-        os.remove(txt_path)
-        if os.path.exists(img_folder):
-            shutil.rmtree(img_folder)
-    except (OSError, shutil.Error) as cleanup_error:
-        logging.error("清理文件时出错: %s", cleanup_error)
-        print(f"清理文件时出错: {cleanup_error}")
+        if write_cbz:
+            with zipfile.ZipFile(cbz_part_path, 'w', zipfile.ZIP_STORED) as cbz:
+                for path in page_paths:
+                    arcname = os.path.basename(path)
+                    if pdf_pages is None:
+                        # 仅输出CBZ时直接流式写入, 无需读入内存
+                        cbz.write(path, arcname)
+                        continue
+
+                    with open(path, 'rb') as page_file:
+                        data = page_file.read()
+                    pdf_pages.append(data)
+                    cbz.writestr(zipfile.ZipInfo.from_file(path, arcname), data,
+                                 compress_type=zipfile.ZIP_STORED)
+
+                cbz.writestr('ComicInfo.xml', comic_info_xml(magazine_id, len(page_paths)),
+                             compress_type=zipfile.ZIP_DEFLATED)
+        elif pdf_pages is not None:
+            for path in page_paths:
+                with open(path, 'rb') as page_file:
+                    pdf_pages.append(page_file.read())
+
+        if pdf_pages is not None:
+            # 先完成转换再创建文件, 转换失败时不会留下空的临时文件
+            with TRACER.span('pdf_build', magazine_id=magazine_id, pages=len(pdf_pages)):
+                pdf_data = img2pdf.convert(pdf_pages)
+                with open(pdf_part_path, "wb") as pdf_file:
+                    pdf_file.write(pdf_data)
+
+        if before_publish is not None:
+            before_publish()
+
+        if pdf_pages is not None:
+            publish_file(pdf_part_path, pdf_path, move=True, report=publish_report)
+
+        if write_cbz:
+            publish_file(cbz_part_path, cbz_path, move=True, report=publish_report)
+    except Exception:
+        # 任一输出失败时清理未发布的临时文件
+        _remove_if_exists(pdf_part_path)
+        _remove_if_exists(cbz_part_path)
+        raise
+
+
+def comic_info_xml(title, page_count):
+    """生成CBZ使用的ComicInfo.xml元数据"""
+    pages = '\n'.join(
+        f'    <Page Image="{i}" Type="FrontCover" />' if i == 0
+        else f'    <Page Image="{i}" />'
+        for i in range(page_count))
+    return ('<?xml version="1.0" encoding="utf-8"?>\n'
+            '<ComicInfo xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+            f'  <Title>{escape(title)}</Title>\n'
+            f'  <PageCount>{page_count}</PageCount>\n'
+            '  <Pages>\n'
+            f'{pages}\n'
+            '  </Pages>\n'
+            '</ComicInfo>\n')
+
+
+# Linux FICLONE ioctl编号, 用于在支持的文件系统(btrfs/xfs)上创建reflink
+FICLONE = 0x40049409
+
+
+class PublishReport:
+    """记录一次运行中文件发布的方式与实际复制的字节数(线程安全)"""
 
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {'rename': 0, 'link': 0, 'reflink': 0, 'copy': 0}
+        self.bytes_published = 0
+        self.bytes_copied = 0
+
+    def record(self, method, size, copied):
+        """记录一次文件发布"""
+        with self.lock:
+            self.counts[method] += 1
+            self.bytes_published += size
+            self.bytes_copied += copied
+
+    def summary(self):
+        """返回发布统计摘要"""
+        with self.lock:
+            return (f'发布 {sum(self.counts.values())} 个文件'
+                    f'(重命名 {self.counts["rename"]}, 硬链接 {self.counts["link"]}, '
+                    f'reflink {self.counts["reflink"]}, 复制 {self.counts["copy"]}), '
+                    f'共 {self.bytes_published} 字节, 实际复制 {self.bytes_copied} 字节')
+
+
+def publish_file(src, dst, move=False, report=None):
+    """发布文件到目标路径
+
+    同一文件系统内依次尝试重命名(move=True时)、硬链接和reflink,
+    均不可用或跨设备时才真正复制数据。链接和复制先写入目标目录下的临时文件,
+    成功后再替换目标, 失败时保留原有文件。返回实际复制的字节数。
+    """
+    dst_dir = os.path.dirname(dst) or '.'
+    os.makedirs(dst_dir, exist_ok=True)
+    size = os.path.getsize(src)
+    method = None
+
+    if os.stat(src).st_dev == os.stat(dst_dir).st_dev:
+        if move:
+            try:
+                os.replace(src, dst)
+                method = 'rename'
+            except OSError:
+                pass
 
-def ui_main():
-    """应用程序UI入口函数"""
-    # 配置日志
+    temp_path = f'{dst}.{uuid.uuid4().hex}.tmp'
+    if method is None and os.stat(src).st_dev == os.stat(dst_dir).st_dev:
+        try:
+            os.link(src, temp_path)
+            method = 'link'
+        except (OSError, AttributeError):
+            if _reflink_file(src, temp_path):
+                method = 'reflink'
+
+    copied = 0
+    try:
+        if method is None:
+            copied = _copy_file_data(src, temp_path)
+            method = 'copy'
+        if method != 'rename':
+            os.replace(temp_path, dst)
+            # 目标已是同一文件的硬链接时rename不做任何操作, 需删除临时链接
+            _remove_if_exists(temp_path)
+    except OSError:
+        _remove_if_exists(temp_path)
+        raise
+
+    if move and method != 'rename':
+        os.remove(src)
+
+    if report is not None:
+        report.record(method, size, copied)
+    return copied
+
+
+def _remove_if_exists(path):
+    """删除文件, 文件不存在时忽略"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _reflink_file(src, dst):
+    """尝试通过FICLONE创建写时复制副本, 成功返回True"""
+    if fcntl is None:
+        return False
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        _remove_if_exists(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def _copy_file_data(src, dst):
+    """跨设备复制文件内容, 优先使用copy_file_range/sendfile在内核中完成"""
+    size = os.path.getsize(src)
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        offset = 0
+        for name in ('copy_file_range', 'sendfile'):
+            if not hasattr(os, name) or offset >= size:
+                continue
+            os.lseek(fdst.fileno(), offset, os.SEEK_SET)
+            try:
+                while offset < size:
+                    if name == 'sendfile':
+                        sent = os.sendfile(fdst.fileno(), fsrc.fileno(),
+                                           offset, size - offset)
+                    else:
+                        sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(),
+                                                  size - offset, offset, offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                break
+            except OSError:
+                continue
+
+        if offset < size:
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            shutil.copyfileobj(fsrc, fdst)
+
+    shutil.copystat(src, dst)
+    return size
+
+
+# 封面缩略图尺寸(最长边像素)与输出格式
+THUMBNAIL_SIZES = (512, 256, 128)
+THUMBNAIL_FORMATS = (('JPEG', 'jpg', {'quality': 85, 'optimize': True}),
+                     ('WEBP', 'webp', {'quality': 80, 'method': 4}))
+THUMBNAIL_DIR = 'thumbnails'
+
+
+class ThumbnailWorker:
+    """在后台线程池中生成封面缩略图"""
+
+    def __init__(self, max_workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='thumbnail')
+        self.futures = []
+
+    def submit(self, cover_path, output_folder, report=None, quality=85):
+        """提交一个封面缩略图生成任务"""
+        self.futures.append(self.executor.submit(
+            _traced_thumbnails, cover_path, output_folder, report, quality))
+
+    def wait(self):
+        """等待所有任务完成并关闭线程池, 返回生成缩略图的封面数"""
+        generated = 0
+        for future in self.futures:
+            try:
+                if future.result():
+                    generated += 1
+            except (OSError, ValueError, UnidentifiedImageError) as thumb_error:
+                logging.error('生成缩略图失败: %s', thumb_error)
+        self.futures.clear()
+        self.executor.shutdown(wait=True)
+        return generated
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """计算文件的SHA-1摘要"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _traced_thumbnails(cover_path, output_folder, report, quality):
+    """在时间线中记录缩略图生成"""
+    with TRACER.span('thumbnails', magazine_id=os.path.basename(output_folder)):
+        return generate_cover_thumbnails(cover_path, output_folder, report, quality)
+
+
+def generate_cover_thumbnails(cover_path, output_folder, report=None, quality=85):
+    """生成多尺寸封面缩略图
+
+    使用JPEG draft模式按缩小比例直接解码, 不解码全分辨率图像。
+    quality只覆盖JPEG质量, WebP使用THUMBNAIL_FORMATS中的设置。
+    封面摘要未变化且缩略图齐全时跳过, 返回是否重新生成。
+    """
+    thumb_folder = os.path.join(output_folder, THUMBNAIL_DIR)
+    hash_path = os.path.join(thumb_folder, 'cover.sha1')
+    expected = [os.path.join(thumb_folder, f'cover_{size}.{ext}')
+                for size in THUMBNAIL_SIZES for _, ext, _ in THUMBNAIL_FORMATS]
+
+    cover_hash = file_digest(cover_path)
+    if os.path.exists(hash_path) and all(os.path.exists(p) for p in expected):
+        with open(hash_path, 'r', encoding='utf-8') as f:
+            if f.read().strip() == cover_hash:
+                return False
+
+    os.makedirs(thumb_folder, exist_ok=True)
+    with Image.open(cover_path) as img:
+        largest = max(THUMBNAIL_SIZES)
+        img.draft('RGB', (largest, largest))
+        thumb = img.convert('RGB')
+
+    # 从大到小依次缩放, 每次都基于上一级结果
+    for size in sorted(THUMBNAIL_SIZES, reverse=True):
+        thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for fmt, ext, options in THUMBNAIL_FORMATS:
+            thumb_path = os.path.join(thumb_folder, f'cover_{size}.{ext}')
+            part_path = f'{thumb_path}.{uuid.uuid4().hex}.part'
+            if fmt == 'JPEG':
+                options = dict(options, quality=quality)
+            try:
+                thumb.save(part_path, fmt, **options)
+            except (OSError, KeyError) as save_error:  # Pillow未编译WebP支持时
+                logging.error('保存缩略图失败 %s: %s', thumb_path, save_error)
+                _remove_if_exists(part_path)
+                continue
+            publish_file(part_path, thumb_path, move=True, report=report)
+
+    with open(hash_path, 'w', encoding='utf-8') as f:
+        f.write(cover_hash)
+    return True
+
+
+def find_issue_pdfs(target_dir, magazine_ids=None, pattern=None):
+    """在输出目录中查找已生成PDF的杂志, 可按ID列表或通配符筛选, 按ID排序"""
+    if magazine_ids:
+        candidates = list(magazine_ids)
+    else:
+        candidates = sorted(os.listdir(target_dir))
+        if pattern:
+            candidates = fnmatch.filter(candidates, pattern)
+
+    found = []
+    for magazine_id in candidates:
+        if os.path.isfile(os.path.join(target_dir, magazine_id, f'{magazine_id}.pdf')):
+            found.append(magazine_id)
+        elif magazine_ids:
+            logging.warning('未找到杂志PDF, 已跳过: %s', magazine_id)
+    return found
+
+
+def assemble_volume(target_dir, magazine_ids, output_path, title=None,
+                    publish_report=None):
+    """将已生成的各期PDF合并为合订本, 返回合订本页数
+
+    直接复制各期的页面对象, 不解码也不重新编码图片, 内容相同的图片对象只保留一份。
+    各期文件在保存前保持打开, 图片数据在写出时才从源文件读取, 内存占用与页数无关。
+    每期在书签中对应一个条目。
+    """
+    part_path = f'{output_path}.part'
+    with ExitStack() as stack:
+        volume = stack.enter_context(pikepdf.new())
+        images = {}
+        bookmarks = []
+
+        for magazine_id in magazine_ids:
+            issue_path = os.path.join(target_dir, magazine_id, f'{magazine_id}.pdf')
+            issue = stack.enter_context(pikepdf.open(issue_path))
+            first_page = len(volume.pages)
+            volume.pages.extend(issue.pages)
+            for page in volume.pages[first_page:]:
+                _share_identical_images(page, images)
+            bookmarks.append((str(issue.docinfo.get('/Title', magazine_id)), first_page))
+
+        with volume.open_outline() as outline:
+            for issue_title, first_page in bookmarks:
+                outline.root.append(pikepdf.OutlineItem(issue_title, first_page))
+        if title:
+            volume.docinfo['/Title'] = title
+
+        page_count = len(volume.pages)
+        with TRACER.span('volume_save', issues=len(bookmarks), pages=page_count):
+            volume.save(part_path,
+                        stream_decode_level=pikepdf.StreamDecodeLevel.none,
+                        object_stream_mode=pikepdf.ObjectStreamMode.generate)
+
+    publish_file(part_path, output_path, move=True, report=publish_report)
+    return page_count
+
+
+def _share_identical_images(page, images):
+    """将页面引用的图片替换为已出现过的相同图片对象
+
+    先按长度/尺寸/编码分组, 只有同组出现多个候选时才计算原始数据摘要。
+    """
+    resources = page.obj.get('/Resources')
+    xobjects = resources.get('/XObject') if resources is not None else None
+    if xobjects is None:
+        return
+
+    for name, xobj in list(xobjects.items()):
+        if xobj.get('/Subtype') != pikepdf.Name.Image:
+            continue
+        group_key = (int(xobj.get('/Length', 0)), int(xobj.get('/Width', 0)),
+                     int(xobj.get('/Height', 0)), str(xobj.get('/Filter', '')))
+        candidates = images.setdefault(group_key, [])
+        if not candidates:
+            candidates.append([None, xobj])
+            continue
+
+        digest = hashlib.sha1(xobj.read_raw_bytes()).hexdigest()
+        for candidate in candidates:
+            if candidate[0] is None:
+                candidate[0] = hashlib.sha1(candidate[1].read_raw_bytes()).hexdigest()
+            if candidate[0] == digest:
+                xobjects[name] = candidate[1]
+                break
+        else:
+            candidates.append([digest, xobj])
+
+
+# 分布式转换任务队列配置
+JOB_LEASE_TIMEOUT = 60
+JOB_HEARTBEAT_INTERVAL = 15
+JOB_MAX_ATTEMPTS = 3
+JOB_STATES = ('pending', 'leased', 'done', 'failed', 'staging')
+
+
+class LeaseLostError(Exception):
+    """任务租约已过期并可能被其他节点接管"""
+
+
+class JobQueue:
+    """基于共享目录的转换任务队列
+
+    任务以JSON文件存放在 pending/leased/done/failed 子目录中, 状态转换通过
+    原子重命名完成, 多个节点可共享同一目录。领取任务时生成租约标识, 之后由心跳
+    持续刷新 leased 文件的修改时间, 超过租约时间未刷新的任务会被重新放回队列。
+    """
+
+    def __init__(self, queue_dir, lease_timeout=JOB_LEASE_TIMEOUT,
+                 max_attempts=JOB_MAX_ATTEMPTS):
+        self.queue_dir = queue_dir
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        for state in JOB_STATES:
+            os.makedirs(self.state_dir(state), exist_ok=True)
+
+    def state_dir(self, state):
+        """返回指定状态的任务目录"""
+        return os.path.join(self.queue_dir, state)
+
+    def job_path(self, state, job_id):
+        """返回指定状态下任务文件的路径"""
+        return os.path.join(self.state_dir(state), f'{job_id}.json')
+
+    def enqueue(self, job_spec, magazine_id):
+        """加入一个转换任务, 已在队列中或处理中的任务不会重复加入"""
+        if any(os.path.exists(self.job_path(state, magazine_id))
+               for state in ('pending', 'leased')):
+            return False
+        job = {
+            'id': magazine_id,
+            'magazine_id': magazine_id,
+            'spec': job_spec.to_dict(),
+            'attempts': 0,
+            'owner': None,
+            'error': None,
+            'enqueued_at': time.time(),
+        }
+        self._write_job(self.job_path('pending', magazine_id), job)
+        return True
+
+    def claim(self, worker_id):
+        """领取一个待处理任务, 没有任务时返回None"""
+        for name in sorted(os.listdir(self.state_dir('pending'))):
+            if not name.endswith('.json'):
+                continue
+            try:
+                return self._transition(os.path.join(self.state_dir('pending'), name),
+                                        'leased', owner=worker_id,
+                                        lease=uuid.uuid4().hex,
+                                        claimed_at=time.time(), increment=True)
+            except FileNotFoundError:  # 已被其他节点领取
+                continue
+        return None
+
+    def owns(self, job):
+        """检查租约是否仍属于该任务的领取者"""
+        try:
+            with open(self.job_path('leased', job['id']), 'r', encoding='utf-8') as f:
+                return json.load(f).get('lease') == job['lease']
+        except (OSError, ValueError):
+            return False
+
+    def heartbeat(self, job):
+        """刷新租约, 租约已丢失时返回False"""
+        if not self.owns(job):
+            return False
+        try:
+            os.utime(self.job_path('leased', job['id']))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, job):
+        """标记任务完成"""
+        return self._finish(job, 'done', error=None, finished_at=time.time())
+
+    def fail(self, job, error):
+        """标记任务失败, 未超过重试次数时放回队列"""
+        return self._finish(job, self._retry_state(job), error=error,
+                            owner=None, lease=None)
+
+    def reap_expired(self):
+        """将租约过期的任务放回队列或标记失败, 返回处理的任务数"""
+        reaped = 0
+        now = time.time()
+        for name in os.listdir(self.state_dir('leased')):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.state_dir('leased'), name)
+            try:
+                if now - os.path.getmtime(path) <= self.lease_timeout:
+                    continue
+                job = self._transition(path, self._retry_state,
+                                       owner=None, lease=None, error='租约过期')
+            except (FileNotFoundError, ValueError):
+                continue
+            logging.warning('任务租约过期: %s', job['id'])
+            reaped += 1
+        return reaped + self._recover_staging(now)
+
+    def _recover_staging(self, now):
+        """恢复状态转换中途崩溃而遗留在staging目录中的任务"""
+        recovered = 0
+        for name in os.listdir(self.state_dir('staging')):
+            path = os.path.join(self.state_dir('staging'), name)
+            # rename保留原文件的mtime, 因此按文件名中的取得时间判断是否中断
+            try:
+                staged_at = int(name.rsplit('.', 2)[-2]) / 1e9
+            except (IndexError, ValueError):
+                continue
+            try:
+                if now - staged_at <= self.lease_timeout:
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    job_id = json.load(f)['id']
+            except (OSError, ValueError, KeyError):
+                continue
+
+            # 目标状态文件已写入时只需删除遗留文件, 否则放回队列
+            if any(os.path.exists(self.job_path(state, job_id))
+                   for state in ('pending', 'leased', 'done', 'failed')):
+                _remove_if_exists(path)
+                continue
+            try:
+                self._transition(path, 'pending', owner=None, lease=None,
+                                 error='状态转换中断')
+            except (FileNotFoundError, ValueError):
+                continue
+            logging.warning('恢复中断的任务: %s', job_id)
+            recovered += 1
+        return recovered
+
+    def _retry_state(self, job):
+        """未超过重试次数时放回队列, 否则标记失败"""
+        return 'failed' if job['attempts'] >= self.max_attempts else 'pending'
+
+    def _finish(self, job, state, **updates):
+        """从leased转换到最终状态, 租约已丢失时返回False"""
+        try:
+            self._transition(self.job_path('leased', job['id']), state,
+                             expect_lease=job['lease'], **updates)
+            return True
+        except (FileNotFoundError, LeaseLostError):
+            logging.error('任务租约已丢失: %s', job['id'])
+            return False
+
+    def _transition(self, path, state, increment=False, expect_lease=None, **updates):
+        """原子地取得任务文件并以新内容写入目标状态目录
+
+        state可以是状态名, 也可以是根据任务内容返回状态名的函数。
+        指定expect_lease时租约不匹配则放回原处并抛出LeaseLostError。
+        staging中的文件名带有取得时间, 供_recover_staging判断是否中断。
+        """
+        claim_path = os.path.join(
+            self.state_dir('staging'),
+            f'.{os.path.basename(path)}.{time.time_ns()}.{uuid.uuid4().hex}')
+        os.rename(path, claim_path)
+        with open(claim_path, 'r', encoding='utf-8') as f:
+            job = json.load(f)
+        if expect_lease is not None and job.get('lease') != expect_lease:
+            os.rename(claim_path, path)
+            raise LeaseLostError(job['id'])
+
+        job.update(updates, updated_at=time.time())
+        if increment:
+            job['attempts'] += 1
+        if callable(state):
+            state = state(job)
+        self._write_job(self.job_path(state, job['id']), job)
+        os.remove(claim_path)
+        return job
+
+    @staticmethod
+    def _write_job(path, job):
+        """通过临时文件原子写入任务文件"""
+        part_path = f'{path}.{uuid.uuid4().hex}.part'
+        with open(part_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(part_path, path)
+
+
+class LeaseHeartbeat(Thread):
+    """处理任务期间定期刷新租约的后台线程"""
+
+    def __init__(self, queue, job, interval=JOB_HEARTBEAT_INTERVAL):
+        super().__init__(name=f'heartbeat-{job["id"]}', daemon=True)
+        self.queue = queue
+        self.job = job
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.lost = False
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            if not self.queue.heartbeat(self.job):
+                self.lost = True
+                return
+
+    def stop(self):
+        """停止心跳"""
+        self.stop_event.set()
+        self.join()
+
+
+def enqueue_source_dir(queue, job_spec):
+    """将源目录中所有待处理杂志加入任务队列, 返回新加入的任务数"""
+    added = 0
+    for filename in sorted(os.listdir(job_spec.source_dir)):
+        if filename.endswith('.txt') and queue.enqueue(job_spec, filename[:-4]):
+            added += 1
+    return added
+
+
+def run_worker(queue, worker_id=None, poll_interval=2.0, stop_event=None,
+               exit_when_idle=False, trace_dir=''):
+    """转换节点主循环: 领取任务、处理并回报结果, 返回处理的任务数"""
+    tracing = bool(trace_dir) and TRACER.start()
+    try:
+        return _worker_loop(queue, worker_id, poll_interval, stop_event, exit_when_idle)
+    finally:
+        if tracing:
+            TRACER.stop(trace_dir)
+
+
+def _worker_loop(queue, worker_id, poll_interval, stop_event, exit_when_idle):
+    """转换节点的任务循环"""
+    worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+    stop_event = stop_event or threading.Event()
+    publish_report = PublishReport()
+    thumbnail_worker = ThumbnailWorker()
+    handled = 0
+
+    logging.info('转换节点已启动: %s, 队列: %s', worker_id, queue.queue_dir)
+    while not stop_event.is_set():
+        with TRACER.span('claim', worker_id=worker_id):
+            queue.reap_expired()
+            job = queue.claim(worker_id)
+        if job is None:
+            if exit_when_idle:
+                break
+            stop_event.wait(poll_interval)
+            continue
+
+        logging.info('领取任务: %s (第 %d 次尝试)', job['id'], job['attempts'])
+        heartbeat = LeaseHeartbeat(queue, job,
+                                   interval=min(JOB_HEARTBEAT_INTERVAL,
+                                                queue.lease_timeout / 3))
+        heartbeat.start()
+
+        def check_lease(job=job, heartbeat=heartbeat):
+            if heartbeat.lost or not queue.owns(job):
+                raise LeaseLostError(job['id'])
+
+        try:
+            with TRACER.span('job', magazine_id=job['magazine_id'],
+                             attempt=job['attempts']):
+                main_processor(JobSpec.from_dict(job['spec']), job['magazine_id'],
+                               publish_report, thumbnail_worker, check_lease)
+        except LeaseLostError:
+            # 任务已被其他节点接管, 不发布输出也不清理源文件
+            heartbeat.stop()
+            logging.warning('任务租约已丢失, 放弃处理: %s', job['id'])
+        except Exception as processing_error:  # img2pdf等会抛出非OSError的异常
+            heartbeat.stop()
+            logging.error('任务处理失败 %s: %s', job['id'], processing_error)
+            queue.fail(job, f'{type(processing_error).__name__}: {processing_error}')
+        else:
+            heartbeat.stop()
+            queue.complete(job)
+        handled += 1
+
+    thumbnail_worker.wait()
+    logging.info('转换节点退出: %s, 共处理 %d 个任务, %s',
+                 worker_id, handled, publish_report.summary())
+    return handled
+
+
+def configure_logging(level=logging.ERROR):
+    """配置日志输出到tools.log和控制台"""
     logging.basicConfig(
-        level=logging.ERROR,
+        level=level,
         format='%(asctime)s - %(levelname)s - %(message)s',
         handlers=[
             logging.FileHandler('tools.log'),
@@ -877,10 +2654,84 @@ def ui_main():
         ]
     )
 
+
+def cli_main(argv=None):
+    """命令行入口: 任务入队与转换节点模式"""
+    parser = argparse.ArgumentParser(description='图书PDF生成工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    worker_parser = subparsers.add_parser('worker', help='作为转换节点从任务队列领取任务')
+    worker_parser.add_argument('--queue', required=True, help='共享任务队列目录')
+    worker_parser.add_argument('--worker-id', help='节点标识, 默认为主机名-进程号')
+    worker_parser.add_argument('--poll-interval', type=float, default=2.0,
+                               help='队列为空时的轮询间隔(秒)')
+    worker_parser.add_argument('--lease-timeout', type=float, default=JOB_LEASE_TIMEOUT,
+                               help='租约超时时间(秒)')
+    worker_parser.add_argument('--exit-when-idle', action='store_true',
+                               help='队列为空时退出')
+    worker_parser.add_argument('--trace-dir', default='',
+                               help='导出Chrome/Perfetto时间线JSON的目录')
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='将源目录中的杂志加入任务队列')
+    enqueue_parser.add_argument('--queue', required=True, help='共享任务队列目录')
+    enqueue_parser.add_argument('--config', default='preferences.cfg',
+                                help='未指定的参数从该配置文件读取')
+    enqueue_parser.add_argument('--source', help='源目录(共享存储路径)')
+    enqueue_parser.add_argument('--target', help='目标目录(共享存储路径)')
+    enqueue_parser.add_argument('--format', choices=list(OUTPUT_FORMAT_CHOICES),
+                                help='输出格式')
+
+    volume_parser = subparsers.add_parser('volume', help='将已生成的各期PDF合并为合订本')
+    volume_parser.add_argument('magazine_ids', nargs='*', help='按顺序合并的杂志ID')
+    volume_parser.add_argument('--config', default='preferences.cfg',
+                               help='未指定目标目录时从该配置文件读取')
+    volume_parser.add_argument('--target', help='各期PDF所在的输出目录')
+    volume_parser.add_argument('--pattern', help='未指定ID时按通配符筛选杂志ID, 如 "2024*"')
+    volume_parser.add_argument('--title', help='合订本标题')
+    volume_parser.add_argument('--output', required=True, help='合订本输出路径')
+
+    args = parser.parse_args(argv)
+    configure_logging(logging.INFO)
+
+    if args.command == 'worker':
+        queue = JobQueue(args.queue, lease_timeout=args.lease_timeout)
+        run_worker(queue, args.worker_id, args.poll_interval,
+                   exit_when_idle=args.exit_when_idle, trace_dir=args.trace_dir)
+    elif args.command == 'enqueue':
+        job_spec = JobSpec.from_config(PreferencesStore(args.config).load())
+        job_spec = replace(
+            job_spec,
+            source_dir=os.path.abspath(args.source or job_spec.source_dir),
+            target_dir=os.path.abspath(args.target or job_spec.target_dir),
+            output_formats=(OUTPUT_FORMAT_CHOICES[args.format] if args.format
+                            else job_spec.output_formats)
+        )
+
+        queue = JobQueue(args.queue)
+        added = enqueue_source_dir(queue, job_spec)
+        print(f'已加入 {added} 个任务')
+    elif args.command == 'volume':
+        target_dir = args.target or JobSpec.from_config(
+            PreferencesStore(args.config).load()).target_dir
+        magazine_ids = find_issue_pdfs(target_dir, args.magazine_ids, args.pattern)
+        if not magazine_ids:
+            parser.error('没有找到可合并的杂志PDF')
+        page_count = assemble_volume(target_dir, magazine_ids, args.output, args.title)
+        print(f'合订本已生成: {args.output}, 共 {len(magazine_ids)} 期 {page_count} 页')
+
+
+def ui_main():
+    """应用程序UI入口函数"""
+    # 配置日志
+    configure_logging()
+
     # 创建并运行主窗口
     window_manager = WindowManager()
     window_manager.root.mainloop()
 
 
 if __name__ == "__main__":
-    ui_main()
+    if len(sys.argv) > 1:
+        cli_main()
+    else:
+        ui_main()
@@ -0,0 +1,233 @@
+"""共享目录任务队列的多进程测试
+
+在同一台机器上启动多个 worker 进程, 验证领取/完成、租约过期重新入队,
+以及超过重试次数后移入 failed 目录。
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pikepdf
+import pytest
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'BooKanTool.py')
+sys.path.insert(0, ROOT)
+
+import BooKanTool  # noqa: E402
+
+
+def make_magazine(source_dir, magazine_id, pages=3, corrupt=False):
+    """在源目录中生成一本带TXT清单的杂志"""
+    folder = os.path.join(source_dir, magazine_id)
+    os.makedirs(folder)
+    names = []
+    for index in range(pages):
+        name = f'page_{index}.jpg'
+        path = os.path.join(folder, name)
+        if corrupt and index == 1:
+            with open(path, 'wb') as f:
+                f.write(b'not a jpeg')
+        else:
+            Image.new('RGB', (60, 80), (index * 40, 90, 150)).save(path)
+        names.append(name)
+    with open(os.path.join(source_dir, f'{magazine_id}.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(f'/sdcard/bookan/{name}' for name in names) + '\n')
+
+
+def setup_queue(tmp_path, magazine_ids, corrupt_ids=()):
+    """创建源目录、目标目录并把杂志加入队列"""
+    source_dir = str(tmp_path / 'source')
+    target_dir = str(tmp_path / 'target')
+    os.makedirs(source_dir)
+    for magazine_id in magazine_ids:
+        make_magazine(source_dir, magazine_id, corrupt=magazine_id in corrupt_ids)
+
+    queue = BooKanTool.JobQueue(str(tmp_path / 'queue'))
+    spec = BooKanTool.JobSpec(source_dir, target_dir, max_workers=1)
+    assert BooKanTool.enqueue_source_dir(queue, spec) == len(magazine_ids)
+    return queue, source_dir, target_dir
+
+
+def run_workers(tmp_path, queue, count, lease_timeout=10):
+    """启动多个 worker 进程直到队列为空"""
+    processes = [
+        subprocess.Popen(
+            [sys.executable, SCRIPT, 'worker', '--queue', queue.queue_dir,
+             '--worker-id', f'worker-{index}', '--poll-interval', '0.1',
+             '--lease-timeout', str(lease_timeout), '--exit-when-idle'],
+            cwd=str(tmp_path),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+        for index in range(count)
+    ]
+    for process in processes:
+        assert process.wait(timeout=120) == 0
+
+
+def jobs_in(queue, state):
+    """返回指定状态下的任务内容, 按ID排序"""
+    jobs = []
+    for name in sorted(os.listdir(queue.state_dir(state))):
+        if name.endswith('.json'):
+            with open(os.path.join(queue.state_dir(state), name), encoding='utf-8') as f:
+                jobs.append(json.load(f))
+    return jobs
+
+
+def test_workers_complete_all_jobs(tmp_path):
+    magazine_ids = [f'mag{i:02d}' for i in range(8)]
+    queue, source_dir, target_dir = setup_queue(tmp_path, magazine_ids)
+
+    run_workers(tmp_path, queue, 3)
+
+    done = jobs_in(queue, 'done')
+    assert [job['id'] for job in done] == magazine_ids
+    assert all(job['attempts'] == 1 for job in done)
+    assert not jobs_in(queue, 'pending') and not jobs_in(queue, 'leased')
+    for magazine_id in magazine_ids:
+        assert os.path.isfile(os.path.join(target_dir, magazine_id, f'{magazine_id}.pdf'))
+        assert not os.path.exists(os.path.join(source_dir, f'{magazine_id}.txt'))
+    assert not [name for name in os.listdir(queue.state_dir('staging'))
+                if not name.endswith('.part')]
+
+
+def test_expired_lease_is_requeued(tmp_path):
+    queue, _, target_dir = setup_queue(tmp_path, ['crashed'])
+
+    # 模拟领取后崩溃的节点: 租约从未刷新
+    job = queue.claim('dead-worker')
+    leased_path = queue.job_path('leased', job['id'])
+    os.utime(leased_path, (0, 0))
+
+    run_workers(tmp_path, queue, 2, lease_timeout=5)
+
+    done = jobs_in(queue, 'done')
+    assert [job['id'] for job in done] == ['crashed']
+    assert done[0]['attempts'] == 2
+    assert done[0]['owner'] != 'dead-worker'
+    assert not queue.owns(job)
+    assert os.path.isfile(os.path.join(target_dir, 'crashed', 'crashed.pdf'))
+
+
+def test_failing_job_moves_to_failed_after_max_attempts(tmp_path):
+    queue, source_dir, target_dir = setup_queue(tmp_path, ['good', 'bad'],
+                                                corrupt_ids=('bad',))
+
+    run_workers(tmp_path, queue, 3)
+
+    assert [job['id'] for job in jobs_in(queue, 'done')] == ['good']
+    failed = jobs_in(queue, 'failed')
+    assert [job['id'] for job in failed] == ['bad']
+    assert failed[0]['attempts'] == BooKanTool.JOB_MAX_ATTEMPTS
+    assert failed[0]['error']
+    # 失败的任务不留下临时文件, 源文件保留以便排查
+    assert not os.path.exists(os.path.join(target_dir, 'bad', 'bad.pdf'))
+    assert not [name for name in os.listdir(os.path.join(target_dir, 'bad'))
+                if name.endswith('.part')]
+    assert os.path.exists(os.path.join(source_dir, 'bad.txt'))
+
+
+def test_stale_staging_file_is_recovered(tmp_path):
+    queue, _, _ = setup_queue(tmp_path, ['orphan'])
+
+    # 模拟状态转换中途崩溃: 任务只剩staging中的遗留文件
+    pending_path = queue.job_path('pending', 'orphan')
+    stale_path = os.path.join(queue.state_dir('staging'), '.orphan.json.0.deadbeef')
+    os.rename(pending_path, stale_path)
+
+    assert queue.reap_expired() == 1
+    assert os.path.exists(pending_path)
+    assert not os.path.exists(stale_path)
+
+
+def test_lost_lease_cannot_complete_reclaimed_job(tmp_path):
+    queue, _, _ = setup_queue(tmp_path, ['contested'])
+    queue.lease_timeout = 5
+
+    stale = queue.claim('slow-worker')
+    os.utime(queue.job_path('leased', stale['id']), (0, 0))
+    assert queue.reap_expired() == 1
+    current = queue.claim('other-worker')
+
+    assert not queue.owns(stale) and queue.owns(current)
+    assert not queue.heartbeat(stale)
+    assert not queue.complete(stale)
+    assert jobs_in(queue, 'leased')[0]['owner'] == 'other-worker'
+    assert queue.complete(current)
+    assert [job['id'] for job in jobs_in(queue, 'done')] == ['contested']
+
+
+def test_claiming_old_pending_job_survives_concurrent_reap(tmp_path):
+    queue, _, _ = setup_queue(tmp_path, ['backlog'])
+    queue.lease_timeout = 5
+    other = BooKanTool.JobQueue(queue.queue_dir, lease_timeout=5)
+
+    # 排队已久的任务: 文件mtime早于租约超时
+    os.utime(queue.job_path('pending', 'backlog'), (0, 0))
+
+    # 在领取者写入leased之前, 另一个节点执行回收
+    reaped = []
+    write_job = queue._write_job
+
+    def write_after_reap(path, job):
+        reaped.append(other.reap_expired())
+        write_job(path, job)
+
+    queue._write_job = write_after_reap
+    job = queue.claim('claimer')
+
+    assert reaped == [0]
+    assert job is not None and queue.owns(job)
+    assert job['attempts'] == 1
+    assert not os.path.exists(queue.job_path('pending', 'backlog'))
+    assert not os.listdir(queue.state_dir('staging'))
+
+
+def test_retry_after_lost_lease_keeps_all_pages(tmp_path):
+    source_dir = str(tmp_path / 'source')
+    target_dir = str(tmp_path / 'target')
+    os.makedirs(source_dir)
+    make_magazine(source_dir, 'm1')
+    spec = BooKanTool.JobSpec(source_dir, target_dir)
+
+    # 输出和封面已发布, 清理前发现租约丢失
+    calls = []
+
+    def check_lease():
+        calls.append(None)
+        if len(calls) == 3:
+            raise BooKanTool.LeaseLostError('m1')
+
+    with pytest.raises(BooKanTool.LeaseLostError):
+        BooKanTool.main_processor(spec, 'm1', check_lease=check_lease)
+    assert os.path.exists(os.path.join(target_dir, 'm1', 'cover.jpg'))
+
+    # 重试时源页面仍然完整
+    BooKanTool.main_processor(spec, 'm1')
+    with pikepdf.open(os.path.join(target_dir, 'm1', 'm1.pdf')) as pdf:
+        assert len(pdf.pages) == 3
+    assert not os.path.exists(os.path.join(source_dir, 'm1'))
+
+
+def test_enqueue_carries_thumbnail_quality_from_config(tmp_path):
+    source_dir = str(tmp_path / 'source')
+    os.makedirs(source_dir)
+    make_magazine(source_dir, 'm1')
+    config_path = tmp_path / 'preferences.cfg'
+    config_path.write_text('[OUTPUT]\nformat = PDF\nthumbnail_quality = 70\n',
+                           encoding='utf-8')
+    queue_dir = str(tmp_path / 'queue')
+
+    subprocess.run(
+        [sys.executable, SCRIPT, 'enqueue', '--queue', queue_dir,
+         '--config', str(config_path), '--source', source_dir,
+         '--target', str(tmp_path / 'target')],
+        cwd=str(tmp_path), check=True, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+
+    job, = jobs_in(BooKanTool.JobQueue(queue_dir), 'pending')
+    assert job['spec']['thumbnail_quality'] == 70